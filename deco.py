@@ -3,6 +3,19 @@
 
 from functools import update_wrapper, wraps
 
+_MISSING = object()
+# separates positional from keyword arguments in memo keys
+_KWD_MARK = object()
+
+
+def _update_state(wrapper, func):
+    """
+    Refresh the attributes the wrapped function keeps in its __dict__
+    (e.g. countcalls' counter). The static metadata is copied once by @wraps.
+    """
+    wrapper.__dict__.update(func.__dict__)
+    wrapper.__wrapped__ = func
+
 
 def disable(decorator):
     '''
@@ -34,7 +47,7 @@ def countcalls(func):
     def wrapper(*args, **kwargs):
         wrapper.calls += 1
         result = func(*args, **kwargs)
-        update_wrapper(wrapper, func)
+        _update_state(wrapper, func)
         return result
 
     wrapper.calls = 0
@@ -47,16 +60,23 @@ def memo(func):
     faster future lookups.
     """
     vault = dict()
+    vault_get = vault.get
 
     @wraps(func)
     def wrapper(*args, **kwargs):
-        key = str(args) + str(kwargs)
-        if key not in vault:
+        key = args
+        if kwargs:
+            key += (_KWD_MARK, *sorted(kwargs.items()))
+        try:
+            result = vault_get(key, _MISSING)
+        except TypeError:
+            # unhashable arguments, fall back to keying on their string form
+            key = str(args) + str(kwargs)
+            result = vault_get(key, _MISSING)
+        if result is _MISSING:
             result = func(*args, **kwargs)
             vault[key] = result
-        else:
-            result = vault[key]
-        update_wrapper(wrapper, func)
+        _update_state(wrapper, func)
         return result
 
     return wrapper
@@ -65,16 +85,33 @@ def memo(func):
 def n_ary(func):
     """
     Given binary function f(x, y), return an n_ary function such
-    that f(x, y, z) = f(x, f(y,z)), etc. Also allow f(x) = x.
+    that f(x, y, z) = f(f(x, y), z), etc.
     """
 
     @wraps(func)
     def wrapper(first, second, *args):
-        if not args:
-            result = func(first, second)
-        else:
-            result = func(first, wrapper(second, *args))
-        update_wrapper(wrapper, func)
+        result = func(first, second)
+        for arg in args:
+            result = func(result, arg)
+        _update_state(wrapper, func)
+        return result
+
+    return wrapper
+
+
+def n_ary_right(func):
+    """
+    Given binary function f(x, y), return an n_ary function such
+    that f(x, y, z) = f(x, f(y, z)), etc.
+    """
+
+    @wraps(func)
+    def wrapper(first, second, *args):
+        values = (first, second, *args)
+        result = values[-1]
+        for value in reversed(values[:-1]):
+            result = func(value, result)
+        _update_state(wrapper, func)
         return result
 
     return wrapper
@@ -84,18 +121,17 @@ def trace(prefix):
     """Trace calls made to function decorated."""
 
     def wrap(func):
+        name = func.__name__
+
         @wraps(func)
         def wrapper(*args):
-            print(
-                f"{prefix * wrapper.count}-->{func.__name__}({",".join(str(arg) for arg in args)})"
-            )
+            call = f"{name}({",".join(map(str, args))})"
+            print(f"{prefix * wrapper.count}-->{call}")
             wrapper.count += 1
             result = func(*args)
             wrapper.count -= 1
-            print(
-                f"{prefix * wrapper.count}-->{func.__name__}({",".join(str(arg) for arg in args)}) == {result}"
-            )
-            update_wrapper(wrapper, func)
+            print(f"{prefix * wrapper.count}-->{call} == {result}")
+            _update_state(wrapper, func)
             return result
 
         wrapper.count = 0
@@ -10,22 +10,46 @@
 import argparse
 import datetime
 import gzip
+import heapq
 import json
 import logging
 import os
 import re
-import string
+import shutil
+import subprocess
 import sys
-from collections import defaultdict, namedtuple
+import tempfile
+from array import array
+from collections import namedtuple
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
 from enum import Enum
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from statistics import median
-from typing import Any, Callable, Dict, Iterator, List, Optional
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional, used by the pandas and numba stats and medians
+    np = None
+
+try:
+    import pandas as pd
+except ImportError:  # optional, only get_logfile_stats_vectorized needs it
+    pd = None
+
+try:
+    from numba import njit
+except ImportError:  # optional, only get_logfile_stats_jit needs it
+    njit = None
 
 config: Dict[str, Any] = {
     "REPORT_SIZE": 1000,
     "REPORT_DIR": "./reports",
     "LOG_DIR": "./log",
+    "STATS_BACKEND": "plain",
 }
 
 logging_filename = config.get("LOGGING_FILENAME")
@@ -37,7 +61,12 @@ logging.basicConfig(
 )
 
 TEMPLATE_PATH = Path("./template/report.html").resolve()
+TABLE_JSON_PLACEHOLDER = "$table_json"
 ERROR_THRESHOLD = 0.2
+REPORT_PRECISION = 3
+PARSE_BATCH_SIZE = 4096
+# tried in order, gzip.open is used when none of them is installed
+GZIP_DECOMPRESSORS = (("pigz", "-dc"), ("gzip", "-dc"))
 
 
 class LogfileType(Enum):
@@ -69,19 +98,19 @@ LogfileLineInfo = namedtuple(
 )
 
 
-URLStats = namedtuple(
-    "URLStats",
-    [
-        "url",
-        "count",
-        "count_perc",
-        "time_sum",
-        "time_perc",
-        "time_avg",
-        "time_max",
-        "time_med",
-    ],
-)
+@dataclass(slots=True)
+class URLStats:
+    url: str
+    count: int
+    count_perc: float
+    time_sum: float
+    time_perc: float
+    time_avg: float
+    time_max: float
+    time_med: float
+
+
+LogfileParser = Callable[[LogfileInfo], Iterator[List[Optional[LogfileLineInfo]]]]
 
 logfile_line_pattern = (
     r"^([\S]+)\s+"
@@ -99,7 +128,14 @@ logfile_line_pattern = (
     + r"(\d+\.?\d*)"
 )
 
-logfile_line_patter_obj: re.Pattern = re.compile(logfile_line_pattern)
+# nginx writes the access log in ASCII, so lines are matched as bytes and only
+# the fields used by the report are decoded
+logfile_line_patter_obj: re.Pattern = re.compile(logfile_line_pattern.encode("ascii"))
+_LINE_MATCH = logfile_line_patter_obj.match
+_MAKE = LogfileLineInfo._make
+
+filename_pattern = r"^nginx-access-ui\.log-(19\d\d|20\d\d)([01]\d)([0-3]\d)(\.gz|)$"
+_FILENAME_MATCH = re.compile(filename_pattern).match
 
 
 def get_last_logfile_info(log_dir: str | Path) -> Optional[LogfileInfo]:
@@ -109,19 +145,19 @@ def get_last_logfile_info(log_dir: str | Path) -> Optional[LogfileInfo]:
         logging.error(err_msg)
         raise ValueError(err_msg)
 
-    files = [i.name for i in log_path.iterdir() if i.is_file()]
+    with os.scandir(log_path) as it:
+        files = [i.name for i in it if i.is_file(follow_symlinks=False)]
     info = select_last_logfile(files=files)
     return info._replace(path=log_path.joinpath(info.path)) if info else None
 
 
 def select_last_logfile(files: List[str]) -> Optional[LogfileInfo]:
-    filename_pattern = r"^nginx-access-ui.log-(19\d\d|20\d\d)([01]\d)([0-3]\d)(\.gz|)$"
-    pattern_obj = re.compile(pattern=filename_pattern)
-
     result = LogfileInfo(path=None, date=datetime.date.min, type=None)
     today = datetime.date.today()
     for entry in files:
-        match = pattern_obj.match(entry)
+        match = _FILENAME_MATCH(entry)
+        if match is None:
+            continue
 
         try:
             cur_date = datetime.date(
@@ -129,7 +165,7 @@ def select_last_logfile(files: List[str]) -> Optional[LogfileInfo]:
                 month=int(match.group(2)),
                 day=int(match.group(3)),
             )
-        except Exception:
+        except ValueError:
             logging.exception("unable to create a date from %s object", match)
             continue
 
@@ -150,81 +186,383 @@ def select_last_logfile(files: List[str]) -> Optional[LogfileInfo]:
     return
 
 
-def parse_logfile_line(line: str) -> LogfileLineInfo:
-    m: re.Match[str] | None = re.match(logfile_line_patter_obj, line)
+def _fast_parse(line: bytes) -> Optional[LogfileLineInfo]:
+    """
+    Split a well-formed line on its delimiters without the regex.
+    Returns None when the line doesn't fit, so the caller can fall back to it.
+    """
+    try:
+        if line[:1].isspace():
+            return None
+        remote_addr, remote_user, http_x_real_ip, rest = line.split(None, 3)
+        if rest[:1] != b"[":
+            return None
+        end = rest.index(b"]")
+        time_local = rest[1:end]
+        start = rest.index(b'"', end) + 1
+        if not rest[end + 1 : start - 1].isspace():
+            return None
+        end = rest.index(b'"', start)
+        request = rest[start:end]
+        method, url, _ = request.split(None, 2)
+        if not rest[end + 1 : end + 2].isspace():
+            return None
+        status, body_bytes_sent, rest = rest[end + 1 :].split(None, 2)
+        quoted = rest.split(b'"')
+        if (
+            len(quoted) != 11
+            or quoted[0]
+            or not quoted[2].isspace()
+            or not quoted[4].isspace()
+            or not quoted[6].isspace()
+            or not quoted[8].isspace()
+            or not quoted[10][:1].isspace()
+            or not request.startswith(method)
+            or not method.isalpha()
+            or not method.isupper()
+            or len(status) != 3
+            or not status.isdigit()
+            or not body_bytes_sent.isdigit()
+        ):
+            return None
+        # same as the regex's (\d+\.?\d*), float() alone would take nan, 1e3, ...
+        int_part, _, frac_part = quoted[10].strip().partition(b".")
+        if not int_part.isdigit() or frac_part and not frac_part.isdigit():
+            return None
+        return _MAKE(
+            (
+                remote_addr,
+                remote_user,
+                http_x_real_ip,
+                time_local,
+                request,
+                url.decode("utf-8"),
+                int(status),
+                int(body_bytes_sent),
+                quoted[1],
+                quoted[3],
+                quoted[5],
+                quoted[7],
+                quoted[9],
+                float(quoted[10]),
+            )
+        )
+    except ValueError:
+        return None
+
+
+def parse_logfile_line(line: bytes) -> LogfileLineInfo:
+    info = _fast_parse(line)
+    if info is not None:
+        return info
+
+    m: re.Match[bytes] | None = _LINE_MATCH(line)
     if m is None:
         raise ValueError("incorrect line structure")
-    info: LogfileLineInfo = LogfileLineInfo._make(m.group(*range(1, 15)))
-    info = info._replace(
-        status=int(info.status),
-        body_bytes_sent=int(info.body_bytes_sent),
-        request_time=float(info.request_time),
+    g = m.groups()
+    return _MAKE(
+        (
+            *g[:5],
+            g[5].decode("utf-8"),
+            int(g[6]),
+            int(g[7]),
+            *g[8:13],
+            float(g[13]),
+        )
     )
-    return info
+
+
+@contextmanager
+def open_logfile(logfile_info: LogfileInfo) -> Iterator[BinaryIO]:
+    if logfile_info.type is LogfileType.PLAIN:
+        with open(logfile_info.path, "rb") as fd:
+            yield fd
+        return
+
+    cmd = next((i for i in GZIP_DECOMPRESSORS if shutil.which(i[0])), None)
+    if cmd is None:
+        with gzip.open(logfile_info.path, "rb") as fd:
+            try:
+                yield fd
+            except (EOFError, gzip.BadGzipFile) as e:
+                raise ValueError(
+                    f"unable to decompress logfile '{logfile_info.path}': {e}"
+                ) from e
+        return
+
+    # decompress in a separate process so it overlaps with parsing, its stderr
+    # goes to a file rather than a pipe nobody reads until it exits
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(
+            [*cmd, str(logfile_info.path)],
+            stdout=subprocess.PIPE,
+            stderr=err,
+            bufsize=1 << 20,
+        )
+        try:
+            yield proc.stdout
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode != 0:
+            err.seek(0)
+            message = err.read().decode("utf-8", errors="replace").strip()
+            raise ValueError(
+                f"unable to decompress logfile '{logfile_info.path}' "
+                f"with {cmd[0]}: {message}"
+            )
 
 
 def parse_logfile(
     logfile_info: LogfileInfo,
-    logfile_line_parser: Callable[[str], LogfileLineInfo] = parse_logfile_line,
-) -> Iterator[Optional[LogfileLineInfo]]:
+    logfile_line_parser: Callable[[bytes], LogfileLineInfo] = parse_logfile_line,
+) -> Iterator[List[Optional[LogfileLineInfo]]]:
+    """Yield parsed lines in batches of up to PARSE_BATCH_SIZE, None for bad ones."""
     if not os.path.isfile(logfile_info.path):
         raise ValueError(f"incorrect logfile path: '{logfile_info.path}'")
 
-    with open(
-        logfile_info.path, "rb"
-    ) if logfile_info.type is LogfileType.PLAIN else gzip.open(
-        logfile_info.path, "r"
-    ) as fd:
-        for line_binary in fd:
-            line = str(line_binary, encoding="utf-8")
-            try:
-                yield logfile_line_parser(line)
-            except ValueError:
-                logging.warning("unable to parse a line:\n'%s'", line)
-                yield
+    with open_logfile(logfile_info) as fd:
+        while lines := list(islice(fd, PARSE_BATCH_SIZE)):
+            batch: List[Optional[LogfileLineInfo]] = []
+            append = batch.append
+            for line in lines:
+                try:
+                    append(logfile_line_parser(line))
+                except ValueError:
+                    logging.warning(
+                        "unable to parse a line:\n'%s'",
+                        line.decode("utf-8", errors="replace"),
+                    )
+                    append(None)
+            yield batch
 
 
 def get_logfile_stats(
     logfile_info: LogfileInfo,
-    logfile_parser: Callable[[LogfileInfo], Iterator[Optional[LogfileLineInfo]]],
+    logfile_parser: LogfileParser,
     result_size: int,
 ) -> List[URLStats]:
-    stats = dict()
+    # url -> [count, time_sum, time_max, request times as C doubles]
+    stats: Dict[str, list] = dict()
+    get_entry = stats.get
     total_lines = 0
     err_lines = 0
     summary_time = 0.0
-    req_times = defaultdict(list)
 
-    info: LogfileLineInfo
-    for info in logfile_parser(logfile_info):
-        total_lines += 1
-        if info is None:
-            err_lines += 1
-            continue
-        if stats.get(info.URL) is None:
-            stats[info.URL] = URLStats(
-                count=1,
-                time_avg=0.0,
-                time_max=info.request_time,
-                time_sum=info.request_time,
-                url=info.URL,
-                time_med=0.0,
-                time_perc=0.0,
-                count_perc=0.0,
+    batch: List[Optional[LogfileLineInfo]]
+    for batch in logfile_parser(logfile_info):
+        total_lines += len(batch)
+        for info in batch:
+            if info is None:
+                err_lines += 1
+                continue
+            url = info.URL
+            request_time = info.request_time
+            entry = get_entry(url)
+            if entry is None:
+                stats[url] = [
+                    1,
+                    request_time,
+                    request_time,
+                    array("d", (request_time,)),
+                ]
+            else:
+                entry[0] += 1
+                entry[1] += request_time
+                if request_time > entry[2]:
+                    entry[2] = request_time
+                entry[3].append(request_time)
+            summary_time += request_time
+
+    check_error_rate(total_lines=total_lines, err_lines=err_lines)
+
+    top = heapq.nlargest(result_size, stats.items(), key=lambda x: x[1][1])
+    parsed_lines = total_lines - err_lines
+    result: List[URLStats] = []
+    for url, (count, time_sum, time_max, req_times) in top:
+        result.append(
+            make_url_stats(
+                url=url,
+                count=count,
+                time_sum=time_sum,
+                time_max=time_max,
+                time_med=times_median(req_times),
+                parsed_lines=parsed_lines,
+                summary_time=summary_time,
             )
+        )
 
-        else:
-            stats[info.URL] = stats[info.URL]._replace(
-                count=stats[info.URL].count + 1,
-                time_sum=float(
-                    format(stats[info.URL].time_sum + info.request_time, ".3f")
-                ),
-                time_max=max(stats[info.URL].time_max, info.request_time),
+    return result
+
+
+def collect_url_times(
+    logfile_info: LogfileInfo, logfile_parser: LogfileParser
+) -> Tuple[List[str], array, array]:
+    """
+    Return (urls, url ids, request times) with one id and one time per parsed
+    line, kept in C arrays. urls[i] is the url of id i.
+    """
+    url_to_id: Dict[str, int] = dict()
+    get_id = url_to_id.get
+    ids = array("i")
+    times = array("d")
+    total_lines = 0
+    err_lines = 0
+
+    batch: List[Optional[LogfileLineInfo]]
+    for batch in logfile_parser(logfile_info):
+        total_lines += len(batch)
+        for info in batch:
+            if info is None:
+                err_lines += 1
+                continue
+            url_id = get_id(info.URL)
+            if url_id is None:
+                url_id = url_to_id[info.URL] = len(url_to_id)
+            ids.append(url_id)
+            times.append(info.request_time)
+
+    check_error_rate(total_lines=total_lines, err_lines=err_lines)
+    return list(url_to_id), ids, times
+
+
+def get_logfile_stats_vectorized(
+    logfile_info: LogfileInfo,
+    logfile_parser: LogfileParser,
+    result_size: int,
+) -> List[URLStats]:
+    if pd is None:
+        raise RuntimeError("pandas is required for vectorized stats")
+
+    urls, ids, times = collect_url_times(logfile_info, logfile_parser)
+    url_ids = np.frombuffer(ids, dtype=np.intc)
+    request_times = np.frombuffer(times, dtype=np.float64)
+    url_column = pd.Categorical.from_codes(url_ids, categories=pd.Index(urls))
+
+    grouped = (
+        pd.DataFrame({"url": url_column, "rt": request_times})
+        .groupby("url", observed=True, sort=False)
+        .agg(
+            count=("rt", "size"),
+            time_max=("rt", "max"),
+            time_med=("rt", "median"),
+        )
+    )
+    # pandas sums in its own order, bincount adds line by line like the plain
+    # path does, so the reported digits match get_logfile_stats
+    sums = np.bincount(url_ids, weights=request_times, minlength=len(urls))
+    grouped.insert(1, "time_sum", sums[grouped.index.codes])
+    top = grouped.nlargest(result_size, "time_sum")
+
+    parsed_lines = len(times)
+    summary_time = float(request_times.sum())
+    return [
+        make_url_stats(
+            url=url,
+            count=int(count),
+            time_sum=float(time_sum),
+            time_max=float(time_max),
+            time_med=float(time_med),
+            parsed_lines=parsed_lines,
+            summary_time=summary_time,
+        )
+        for url, count, time_sum, time_max, time_med in top.itertuples(name=None)
+    ]
+
+
+def _aggregate_times(url_ids, times, counts, sums, maxes):
+    for i in range(url_ids.size):
+        u = url_ids[i]
+        t = times[i]
+        counts[u] += 1
+        sums[u] += t
+        if t > maxes[u]:
+            maxes[u] = t
+
+
+def _group_times(url_ids, times, offsets, out):
+    pos = offsets.copy()
+    for i in range(url_ids.size):
+        u = url_ids[i]
+        out[pos[u]] = times[i]
+        pos[u] += 1
+
+
+if njit is not None:
+    _aggregate_times = njit(cache=True)(_aggregate_times)
+    _group_times = njit(cache=True)(_group_times)
+
+
+def top_url_ids(sums, result_size: int):
+    """
+    Ids of the result_size largest sums, largest first. Ties keep the lower
+    (earlier seen) id first, like heapq.nlargest in get_logfile_stats.
+    """
+    size = min(result_size, sums.size)
+    if size <= 0:
+        return sums[:0].astype(np.intp)
+    threshold = np.partition(sums, sums.size - size)[sums.size - size]
+    above = np.flatnonzero(sums > threshold)
+    tied = np.flatnonzero(sums == threshold)[: size - above.size]
+    top = np.concatenate((above, tied))
+    return top[np.lexsort((top, -sums[top]))]
+
+
+def get_logfile_stats_jit(
+    logfile_info: LogfileInfo,
+    logfile_parser: LogfileParser,
+    result_size: int,
+) -> List[URLStats]:
+    if njit is None or np is None:
+        raise RuntimeError("numba and numpy are required for jit stats")
+
+    urls, ids, times = collect_url_times(logfile_info, logfile_parser)
+    url_ids = np.frombuffer(ids, dtype=np.intc)
+    request_times = np.frombuffer(times, dtype=np.float64)
+    url_count = len(urls)
+    counts = np.zeros(url_count, dtype=np.int64)
+    sums = np.zeros(url_count, dtype=np.float64)
+    maxes = np.zeros(url_count, dtype=np.float64)
+    _aggregate_times(url_ids, request_times, counts, sums, maxes)
+
+    # request times laid out contiguously per url, for the medians
+    offsets = np.cumsum(counts) - counts
+    grouped_times = np.empty_like(request_times)
+    _group_times(url_ids, request_times, offsets, grouped_times)
+
+    parsed_lines = len(times)
+    summary_time = float(request_times.sum())
+    result: List[URLStats] = []
+    for u in top_url_ids(sums, result_size):
+        count = int(counts[u])
+        start = offsets[u]
+        result.append(
+            make_url_stats(
+                url=urls[u],
+                count=count,
+                time_sum=float(sums[u]),
+                time_max=float(maxes[u]),
+                time_med=float(np.median(grouped_times[start : start + count])),
+                parsed_lines=parsed_lines,
+                summary_time=summary_time,
             )
-        summary_time += info.request_time
-        req_times[info.URL].append(info.request_time)
+        )
+
+    return result
+
+
+def times_median(times: array) -> float:
+    if np is None:
+        return median(times)
+    # np.median selects with a partition instead of sorting the whole sequence
+    return float(np.median(np.frombuffer(times, dtype=np.float64)))
 
-    err_perc = err_lines / total_lines
+
+def check_error_rate(total_lines: int, err_lines: int) -> None:
+    err_perc = err_lines / total_lines if total_lines else 0.0
     if err_perc > ERROR_THRESHOLD:
         logging.error(
             "error threshold = %.2f exceeded, current error rate is %.2f",
@@ -233,20 +571,30 @@ def get_logfile_stats(
         )
         raise RuntimeError("parsing error threshold exceeded")
 
-    result: List[URLStats] = sorted(
-        list(stats.values()), key=lambda x: x.time_sum, reverse=True
-    )[:result_size]
-    for idx, elem in enumerate(result):
-        result[idx] = elem._replace(
-            count_perc=f"{elem.count / (total_lines - err_lines) * 100.0:.3f}",
-            time_perc=f"{elem.time_sum / summary_time * 100.0:.3f}",
-            time_avg=f"{elem.time_sum / elem.count:.3f}",
-            time_med=f"{median(req_times[elem.url]):.3f}",
-        )
 
-    return result
+def make_url_stats(
+    url: str,
+    count: int,
+    time_sum: float,
+    time_max: float,
+    time_med: float,
+    parsed_lines: int,
+    summary_time: float,
+) -> URLStats:
+    time_perc = time_sum / summary_time * 100.0 if summary_time else 0.0
+    return URLStats(
+        url=url,
+        count=count,
+        count_perc=round(count / parsed_lines * 100.0, REPORT_PRECISION),
+        time_sum=round(time_sum, REPORT_PRECISION),
+        time_perc=round(time_perc, REPORT_PRECISION),
+        time_avg=round(time_sum / count, REPORT_PRECISION),
+        time_max=time_max,
+        time_med=round(time_med, REPORT_PRECISION),
+    )
 
 
+@lru_cache(maxsize=32)
 def report_date(date: datetime.date) -> str:
     return f"report-{date.strftime("%Y.%m.%d")}.html"
 
@@ -260,9 +608,14 @@ def report_already_exists(report_path: Path, date: datetime.date) -> bool:
 
 def render_template(table_json: List[Dict], report_path: Path) -> None:
     with open(TEMPLATE_PATH, "r", encoding="utf-8") as tf:
-        s = string.Template(tf.read()).safe_substitute(table_json=table_json)
-    with open(report_path, "w", encoding="utf-8") as of:
-        of.write(s)
+        pre, placeholder, post = tf.read().partition(TABLE_JSON_PLACEHOLDER)
+    if not placeholder:
+        raise ValueError(f"no {TABLE_JSON_PLACEHOLDER} in template: '{TEMPLATE_PATH}'")
+
+    with open(report_path, "w", encoding="utf-8", buffering=1 << 20) as of:
+        of.write(pre)
+        json.dump(table_json, of, separators=(",", ":"))
+        of.write(post)
 
 
 def parse_config(config_text: str) -> Dict[str, str]:
@@ -301,6 +654,13 @@ def config_setup(config: Dict[str, Any]) -> None:
     config.update(**file_config)
 
 
+STATS_BACKENDS: Dict[str, Callable[..., List[URLStats]]] = {
+    "plain": get_logfile_stats,
+    "pandas": get_logfile_stats_vectorized,
+    "numba": get_logfile_stats_jit,
+}
+
+
 def main(config: Dict[str, Any]) -> None:
     config_setup(config)
 
@@ -323,9 +683,14 @@ def main(config: Dict[str, Any]) -> None:
             )
             return
 
+        stats_backend = config.get("STATS_BACKEND")
+        logfile_stats = STATS_BACKENDS.get(stats_backend)
+        if logfile_stats is None:
+            raise ValueError(f"unknown stats backend: '{stats_backend}'")
+
         table_json = [
-            dict(stats._asdict())
-            for stats in get_logfile_stats(
+            asdict(stats)
+            for stats in logfile_stats(
                 logfile_info=last_logfile_info,
                 logfile_parser=parse_logfile,
                 result_size=config.get("REPORT_SIZE"),
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+import importlib
+import io
+import unittest
+from contextlib import redirect_stdout
+
+import deco
+
+
+class Test_memo(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+        @deco.memo
+        def f(*args, **kwargs):
+            self.calls.append((args, kwargs))
+            return len(self.calls)
+
+        self.f = f
+
+    def test_memo_caches_repeated_call(self):
+        self.assertEqual(self.f(1, 2), 1)
+        self.assertEqual(self.f(1, 2), 1)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_memo_keeps_kwargs_apart_from_positional_args(self):
+        self.assertEqual(self.f(1, x=2), 1)
+        self.assertEqual(self.f((1,), (("x", 2),)), 2)
+        self.assertEqual(self.f(1, x=2), 1)
+        self.assertEqual(self.f((1,), (("x", 2),)), 2)
+
+    def test_memo_caches_unhashable_args(self):
+        self.assertEqual(self.f([1]), 1)
+        self.assertEqual(self.f([1]), 1)
+        self.assertEqual(self.f([1, 2]), 2)
+        self.assertEqual(len(self.calls), 2)
+
+
+class Test_n_ary(unittest.TestCase):
+    @staticmethod
+    def sub(a, b):
+        return a - b
+
+    def test_n_ary_folds_left(self):
+        sub = deco.n_ary(self.sub)
+        self.assertEqual(sub(10, 3), 7)
+        self.assertEqual(sub(10, 3, 2, 1), ((10 - 3) - 2) - 1)
+
+    def test_n_ary_right_folds_right(self):
+        sub = deco.n_ary_right(self.sub)
+        self.assertEqual(sub(10, 3), 7)
+        self.assertEqual(sub(10, 3, 2, 1), 10 - (3 - (2 - 1)))
+
+
+class Test_decorated_functions(unittest.TestCase):
+    def setUp(self):
+        # fresh vaults and counters for the module level functions
+        importlib.reload(deco)
+
+    def test_calls_are_visible_through_memo(self):
+        self.assertEqual(deco.foo(4, 3), 7)
+        self.assertEqual(deco.foo(4, 3, 2), 9)
+        self.assertEqual(deco.foo(4, 3), 7)
+        self.assertEqual(deco.foo.calls, 2)
+
+        self.assertEqual(deco.bar(4, 3), 12)
+        self.assertEqual(deco.bar(4, 3, 2), 24)
+        self.assertEqual(deco.bar(4, 3, 2, 1), 24)
+        self.assertEqual(deco.bar.calls, 3)
+
+    def test_fib_is_traced_and_counted(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(deco.fib(3), 3)
+        self.assertEqual(deco.fib.calls, 5)
+        self.assertEqual(deco.fib.__doc__, "Some doc")
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], "-->fib(3)")
+        self.assertEqual(lines[-1], "-->fib(3) == 3")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,8 +3,13 @@
 
 
 import datetime as dt
+import gzip
+import json
+import shutil
+import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
 
 import log_analyzer
 
@@ -28,6 +33,17 @@ class Test_config_parsing(unittest.TestCase):
         full_path = log_analyzer.select_last_logfile(self.test_file_name)
         self.assertEqual(full_path.path, "nginx-access-ui.log-20180630")
 
+    def test_log_file_selection_skips_foreign_files(self):
+        files = [
+            "nginx-access-ui.log-20170630.gz",
+            "nginx-access-ui.log-20180631",
+            "nginx-access-ui.log-20190101.bz2",
+            "nginx-access-uiXlog-20190102",
+        ]
+        info = log_analyzer.select_last_logfile(files)
+        self.assertEqual(info.path, "nginx-access-ui.log-20170630.gz")
+        self.assertIs(info.type, log_analyzer.LogfileType.GZIP)
+
     # def test_config_parsing_good_path(self):
     #     test_good_path = "./app.cfg.example"
     #     json_data = log_analyzer.config_parsing(test_good_path)
@@ -55,5 +71,194 @@ class Test_config_parsing(unittest.TestCase):
     #     self.assertEqual(result_list[0]["time_max"], 5.246)
 
 
+class Test_logfile_line_parsing(unittest.TestCase):
+    line = (
+        b'1.196.116.32 -  - [29/Jun/2017:03:50:22 +0300] '
+        b'"GET /api/v2/banner/25019354 HTTP/1.1" 200 927 "-" "Lynx/2.8.8dev.9" '
+        b'"-" "1498697422-2190034393-4708-9752759" "dc7161be3" 0.390\n'
+    )
+
+    def test_parse_line(self):
+        info = log_analyzer.parse_logfile_line(self.line)
+        self.assertEqual(info.URL, "/api/v2/banner/25019354")
+        self.assertEqual(info.status, 200)
+        self.assertEqual(info.body_bytes_sent, 927)
+        self.assertEqual(info.request_time, 0.390)
+
+    def test_parse_line_with_quote_in_field(self):
+        line = self.line.replace(b"Lynx/2.8.8dev.9", b'Lynx "2.8.8"')
+        info = log_analyzer.parse_logfile_line(line)
+        self.assertEqual(info.http_user_agent, b'Lynx "2.8.8"')
+        self.assertEqual(info.request_time, 0.390)
+
+    def test_parse_line_rejects_non_decimal_request_time(self):
+        for request_time in (b"nan", b"inf", b"-1.0"):
+            with self.subTest(request_time=request_time):
+                line = self.line.replace(b"0.390", request_time)
+                with self.assertRaises(ValueError):
+                    log_analyzer.parse_logfile_line(line)
+
+    def test_parse_line_reads_request_time_digits_only(self):
+        for request_time in (b"1e3", b"1_000"):
+            with self.subTest(request_time=request_time):
+                line = self.line.replace(b"0.390", request_time)
+                info = log_analyzer.parse_logfile_line(line)
+                self.assertEqual(info.request_time, 1.0)
+
+    def test_parse_line_rejects_junk_between_fields(self):
+        for old, new in (
+            (b'"-" "Lynx', b'"-"X"Lynx'),
+            (b'] "GET', b']X"GET'),
+            (b'] "GET', b']"GET'),
+            (b'1.1" 200', b'1.1"200'),
+            (b'"GET', b'" GET'),
+            (b'"GET', b'"\tGET'),
+            (b'" 0.390', b'"0.390'),
+        ):
+            with self.subTest(junk=new):
+                line = self.line.replace(old, new)
+                with self.assertRaises(ValueError):
+                    log_analyzer.parse_logfile_line(line)
+
+    def test_parse_bad_line(self):
+        line = (
+            b'1.202.56.176 -  - [29/Jun/2017:03:59:15 +0300] "0" 400 166 '
+            b'"-" "-" "-" "-" "-" 0.000\n'
+        )
+        with self.assertRaises(ValueError):
+            log_analyzer.parse_logfile_line(line)
+
+
+class Test_logfile_opening(unittest.TestCase):
+    lines = [b"first line\n", b"second line\n"]
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name).joinpath("nginx-access-ui.log-20180630.gz")
+        self.info = log_analyzer.LogfileInfo(
+            path=self.path,
+            date=dt.date(2018, 6, 30),
+            type=log_analyzer.LogfileType.GZIP,
+        )
+
+    def write_gzip(self, lines):
+        with gzip.open(self.path, "wb") as fd:
+            fd.writelines(lines)
+
+    def test_open_gzip_logfile(self):
+        self.write_gzip(self.lines)
+        with log_analyzer.open_logfile(self.info) as fd:
+            self.assertEqual(list(fd), self.lines)
+
+    def test_open_gzip_logfile_without_decompressor(self):
+        self.write_gzip(self.lines)
+        with mock.patch.object(log_analyzer, "GZIP_DECOMPRESSORS", ()):
+            with log_analyzer.open_logfile(self.info) as fd:
+                self.assertEqual(list(fd), self.lines)
+
+    def write_truncated_gzip(self):
+        self.write_gzip(f"line {i}\n".encode() for i in range(100_000))
+        data = self.path.read_bytes()
+        self.path.write_bytes(data[: len(data) // 2])
+
+    @unittest.skipUnless(
+        any(shutil.which(i[0]) for i in log_analyzer.GZIP_DECOMPRESSORS),
+        "no gzip decompressor is installed",
+    )
+    def test_open_truncated_gzip_logfile(self):
+        self.write_truncated_gzip()
+        with self.assertRaisesRegex(ValueError, "unexpected end of file"):
+            with log_analyzer.open_logfile(self.info) as fd:
+                for _ in fd:
+                    pass
+
+    def test_open_truncated_gzip_logfile_without_decompressor(self):
+        self.write_truncated_gzip()
+        with mock.patch.object(log_analyzer, "GZIP_DECOMPRESSORS", ()):
+            with self.assertRaises(ValueError):
+                with log_analyzer.open_logfile(self.info) as fd:
+                    for _ in fd:
+                        pass
+
+    def test_open_non_gzip_logfile_without_decompressor(self):
+        self.path.write_bytes(b"not a gzip archive\n")
+        with mock.patch.object(log_analyzer, "GZIP_DECOMPRESSORS", ()):
+            with self.assertRaises(ValueError):
+                with log_analyzer.open_logfile(self.info) as fd:
+                    for _ in fd:
+                        pass
+
+
+class Test_logfile_stats(unittest.TestCase):
+    logfile_info = log_analyzer.LogfileInfo(
+        path=Path("./log/nginx-access-ui.log-20180630"),
+        date=dt.date(2018, 6, 30),
+        type=log_analyzer.LogfileType.PLAIN,
+    )
+
+    def test_stats_of_empty_logfile(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir).joinpath("nginx-access-ui.log-20180630")
+            path.touch()
+            info = self.logfile_info._replace(path=path)
+            stats = [log_analyzer.get_logfile_stats]
+            if log_analyzer.pd is not None:
+                stats.append(log_analyzer.get_logfile_stats_vectorized)
+            if log_analyzer.njit is not None:
+                stats.append(log_analyzer.get_logfile_stats_jit)
+            for logfile_stats in stats:
+                with self.subTest(logfile_stats=logfile_stats.__name__):
+                    self.assertEqual(
+                        logfile_stats(info, log_analyzer.parse_logfile, 10), []
+                    )
+
+    @unittest.skipIf(log_analyzer.pd is None, "pandas is not installed")
+    def test_vectorized_stats_match_plain_stats(self):
+        expected = log_analyzer.get_logfile_stats(
+            self.logfile_info, log_analyzer.parse_logfile, 10
+        )
+        result = log_analyzer.get_logfile_stats_vectorized(
+            self.logfile_info, log_analyzer.parse_logfile, 10
+        )
+        self.assertEqual(result, expected)
+
+    @unittest.skipIf(log_analyzer.np is None, "numpy is not installed")
+    def test_top_url_ids_keep_first_seen_on_ties(self):
+        sums = log_analyzer.np.array([1.0, 3.0, 2.0, 3.0, 2.0, 0.5])
+        for result_size, expected in (
+            (0, []),
+            (3, [1, 3, 2]),
+            (10, [1, 3, 2, 4, 0, 5]),
+        ):
+            with self.subTest(result_size=result_size):
+                top = log_analyzer.top_url_ids(sums, result_size)
+                self.assertEqual(top.tolist(), expected)
+
+    @unittest.skipIf(log_analyzer.njit is None, "numba is not installed")
+    def test_jit_stats_match_plain_stats(self):
+        expected = log_analyzer.get_logfile_stats(
+            self.logfile_info, log_analyzer.parse_logfile, 10
+        )
+        result = log_analyzer.get_logfile_stats_jit(
+            self.logfile_info, log_analyzer.parse_logfile, 10
+        )
+        self.assertEqual(result, expected)
+
+
+class Test_report_rendering(unittest.TestCase):
+    def test_render_template_writes_json_table(self):
+        table = [{"url": "/api/v2/banner/1", "count": 2, "time_sum": 0.5}]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report_path = Path(tmp_dir).joinpath("report.html")
+            log_analyzer.render_template(table, report_path)
+            report = report_path.read_text(encoding="utf-8")
+
+        self.assertNotIn(log_analyzer.TABLE_JSON_PLACEHOLDER, report)
+        line = next(i for i in report.splitlines() if "var table = " in i)
+        table_text = line.split("var table = ", 1)[1].rstrip(";")
+        self.assertEqual(json.loads(table_text), table)
+
+
 if __name__ == "__main__":
     unittest.main()